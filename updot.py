@@ -18,36 +18,24 @@ import errno
 import sys
 import time
 import socket
+import tarfile
 import getpass
 import shutil
 import argparse
+import atexit
 import json
+import math
 import base64
+import difflib
+import hashlib
+import random
+import re
+import shlex
+import signal
+import tempfile
+import threading
 
-from subprocess import call, check_call, CalledProcessError, STDOUT
-try:
-    # Attempt importing check_output, this fails on Python older than 2.7
-    # so we need to define it ourselves
-    from subprocess import check_output
-except ImportError:
-    # Source: https://gist.github.com/edufelipe/1027906
-    import subprocess
-    def check_output(*popenargs, **kwargs):
-        """
-        Run command with arguments and return its output as a byte string.
-        Backported from Python 2.7 as it's implemented as pure python on stdlib.
-        """
-        process = subprocess.Popen(stdout=subprocess.PIPE, *popenargs, **kwargs)
-        output, unused_err = process.communicate()
-        retcode = process.poll()
-        if retcode:
-            cmd = kwargs.get("args")
-            if cmd is None:
-                cmd = popenargs[0]
-            error = subprocess.CalledProcessError(retcode, cmd)
-            error.output = output
-            raise error
-        return output
+from subprocess import call, check_call, CalledProcessError, Popen, PIPE
 
 # Get proper urllib for Python version
 try:
@@ -57,6 +45,36 @@ except ImportError:
     # Python 2
     import urllib2
 
+# SQLite may be missing from some Python builds, in which case run history is
+# not recorded
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+# File locking is only available on Unix, so concurrent runs are not coalesced
+# elsewhere
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Get proper queue module for Python version
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+# Get shell quoting function for Python version
+try:
+    # Python 3
+    from shlex import quote as shell_quote
+except ImportError:
+    # Python 2
+    from pipes import quote as shell_quote
+
 # Setup input for use in Python 2 or 3
 try:
     input = raw_input
@@ -103,6 +121,19 @@ class DotfileStatusError(Exception):
     """
     pass
 
+# Define errors for handling commands that run out of time
+class CommandTimeoutError(CalledProcessError):
+    """
+    Raised when a command is killed for exceeding its operation deadline.
+    """
+    pass
+
+class RunBudgetExceededError(Exception):
+    """
+    Raised when the overall run budget is exhausted, to stop all further work.
+    """
+    pass
+
 # Script version
 UPDOT_VERSION = "2.27"
 
@@ -125,6 +156,140 @@ errstream = devnull
 # Default message used if none is provided
 DEFAULT_COMMIT_MESSAGE = "updot.py update"
 
+# Remote used when no 'updot.remote' entries are configured
+DEFAULT_REMOTE = "origin"
+
+# Seconds each kind of operation may run before it is killed
+OPERATION_TIMEOUTS = {"local": 60, "network": 120, "maintenance": 1800, "bundle": 1800}
+
+# Seconds an HTTP request may take before it is abandoned
+HTTP_TIMEOUT = 30
+
+# Seconds the internet connection check may take before it is abandoned
+CONNECTIVITY_TIMEOUT = 5
+
+# Attempts made for network operations that fail with a transient error
+NETWORK_ATTEMPTS = 3
+
+# Bounds in seconds for the jittered exponential backoff between attempts
+BACKOFF_BASE = 1
+BACKOFF_MAX = 30
+
+# Seconds given to a cancelled command to exit before it is killed
+KILL_GRACE_PERIOD = 2
+
+# Names of the members of an offline bundle archive
+BUNDLE_MEMBER = "dotfiles.bundle"
+PLAN_MEMBER = "plan.json"
+
+# Manifest entries starting with this prefix are rendered as templates
+TEMPLATE_PREFIX = "template:"
+
+# Matches template placeholders, such as '{{ email }}'
+TEMPLATE_PLACEHOLDER = re.compile(r"\{\{\s*([A-Za-z0-9_.-]+)\s*\}\}")
+
+# Seconds between checks of the dotfiles for changes by the status daemon
+FILE_POLL_INTERVAL = 2
+
+# Seconds between fetches of the remote by the status daemon
+REMOTE_POLL_INTERVAL = 300
+
+# Seconds to wait on the status daemon before checking the status directly
+STATUS_QUERY_TIMEOUT = 0.5
+
+# Seconds an idle shared SSH connection is kept open, in case it is not torn
+# down when the run ends
+SSH_CONTROL_PERSIST = 60
+
+# Seconds to wait for a concurrent sync to finish before giving up
+COALESCE_TIMEOUT = 600
+
+# Seconds the status recorded by a sync may be reused by status checks
+STATUS_CACHE_TTL = 10
+
+# Number of 'git hash-object' processes used to hash files in parallel, and the
+# minimum number of files given to each
+HASH_WORKERS = 4
+HASH_BATCH_MIN = 256
+
+# Attempts made to push when the remote rejects the push
+PUSH_ATTEMPTS = 4
+
+# Default seconds between scheduled runs
+SCHEDULE_INTERVAL = 60 * 60
+
+# Number of runs kept in the run history
+HISTORY_LIMIT = 1000
+
+# Number of recent runs compared against the preceding baseline runs when
+# looking for regressions
+REGRESSION_WINDOW = 5
+BASELINE_WINDOW = 50
+
+# A phase has regressed when its recent median is this many times its baseline
+# median, and at least this many seconds slower
+REGRESSION_FACTOR = 1.5
+REGRESSION_MIN_SECONDS = 0.05
+
+# Repository health thresholds that trigger background maintenance
+LOOSE_OBJECT_THRESHOLD = 500
+PACK_THRESHOLD = 10
+
+# Minimum seconds between background maintenance runs
+MAINTENANCE_INTERVAL = 24 * 60 * 60
+
+# Seconds after which a maintenance lock is considered abandoned
+MAINTENANCE_LOCK_TIMEOUT = 2 * 60 * 60
+
+# Error messages that indicate a network failure worth retrying
+TRANSIENT_ERRORS = (
+    "could not resolve host",
+    "connection timed out",
+    "connection reset",
+    "connection refused",
+    "operation timed out",
+    "network is unreachable",
+    "temporary failure",
+    "early eof",
+    "the remote end hung up unexpectedly",
+    "ssh_exchange_identification",
+    "kex_exchange_identification",
+    "http 502",
+    "http 503",
+    "http 504",
+    "returned error: 502",
+    "returned error: 503",
+    "returned error: 504",
+)
+
+# Time by which the whole run must finish, when a run budget is set
+run_deadline = None
+
+# Commands currently running, so they can be cancelled when the budget runs out
+active_processes = set()
+active_processes_lock = threading.Lock()
+budget_exhausted = threading.Event()
+
+# Background thread reporting on mirror fetches that outlast the primary
+mirror_fetches = None
+
+# Snapshot of the git config, loaded on first use
+git_config_snapshot = None
+
+# Measurements of the current run, recorded in the run history at exit
+run_stats = {
+    "phases": {},
+    "commands": 0,
+    "manifest_size": 0,
+    "link_actions": 0,
+    "bytes_fetched": 0,
+}
+
+# Private directory holding the shared SSH connection sockets for this run
+ssh_control_dir = None
+ssh_base_command = None
+ssh_original_env = None
+
 # Setup directory variables
 UPDOT_DIR = os.path.dirname(os.path.abspath(os.path.realpath(__file__)))
 USER_HOME_DIR = os.path.expanduser("~")
@@ -132,6 +297,18 @@ DOTFILES_DIR = USER_HOME_DIR + "/.dotfiles"
 BACKUP_DIR = USER_HOME_DIR + "/.dotfiles_backup"
 SSH_KEY_PATH = USER_HOME_DIR + "/.ssh/id_rsa.pub"
 MANIFEST_PATH = DOTFILES_DIR + "/dotfiles.manifest"
+TEMPLATE_VARIABLES_DIR = DOTFILES_DIR + "/hosts"
+RENDER_DIR = USER_HOME_DIR + "/.dotfiles_rendered/" + socket.gethostname()
+RENDER_CACHE_PATH = RENDER_DIR + "/render-cache.json"
+OBJECTS_DIR = DOTFILES_DIR + "/.git/objects"
+MAINTENANCE_STAMP_PATH = DOTFILES_DIR + "/.git/updot-maintenance"
+MAINTENANCE_LOCK_PATH = DOTFILES_DIR + "/.git/updot-maintenance.lock"
+STATUS_SOCKET_PATH = DOTFILES_DIR + "/.git/updot-status.sock"
+HISTORY_PATH = DOTFILES_DIR + "/.git/updot-history.sqlite"
+SYNC_LOCK_PATH = DOTFILES_DIR + "/.git/updot-sync.lock"
+SYNC_RESULT_PATH = DOTFILES_DIR + "/.git/updot-result.json"
+VERIFY_CACHE_PATH = DOTFILES_DIR + "/.git/updot-verify-cache.json"
+SCHEDULE_PATH = DOTFILES_DIR + "/.git/updot-schedule.json"
 
 # Custom print functions
 def dprint(*args, **kwargs):
@@ -164,6 +341,279 @@ def set_debug():
         outstream = sys.stdout
         errstream = sys.stderr
 
+def start_run_budget(seconds):
+    """
+    Limits the whole run to the given number of seconds.
+    Once the budget runs out, all outstanding commands are cancelled and no
+    further commands are started.
+
+    Keyword Args:
+    seconds -- seconds the run may take
+    """
+    global run_deadline
+
+    run_deadline = time.time() + seconds
+    watchdog = threading.Timer(seconds, cancel_outstanding_commands)
+    watchdog.daemon = True
+    watchdog.start()
+
+def remaining_budget():
+    """Returns the seconds left in the run budget, or None if there is no budget."""
+    if run_deadline is None:
+        return None
+    return max(run_deadline - time.time(), 0)
+
+def cancel_outstanding_commands():
+    """Marks the run budget as exhausted and stops every running command."""
+    budget_exhausted.set()
+    stop_active_commands()
+
+def stop_active_commands():
+    """
+    Stops every running command. This is also run at exit, so commands still
+    running in the background are not left behind.
+    """
+    with active_processes_lock:
+        processes = list(active_processes)
+    for process in processes:
+        stop_process(process)
+
+def stop_process(process):
+    """
+    Asks a process to terminate, and kills it if it does not exit in time.
+    Terminating first gives git the chance to clean up its lock files.
+
+    Keyword Args:
+    process -- the process to stop
+    """
+    try:
+        process.terminate()
+        deadline = time.time() + KILL_GRACE_PERIOD
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        if process.poll() is None:
+            process.kill()
+    except OSError:
+        pass
+
+def is_transient_error(message):
+    """
+    Checks if an error message describes a network failure worth retrying.
+
+    Keyword Args:
+    message -- error output from the failed command or request
+    """
+    message = message.lower()
+    return any(error in message for error in TRANSIENT_ERRORS)
+
+def backoff(attempt):
+    """
+    Sleeps for a jittered, exponentially growing delay before another attempt.
+    Returns False without sleeping if the run budget cannot cover the delay.
+
+    Keyword Args:
+    attempt -- number of attempts made so far
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    remaining = remaining_budget()
+    if budget_exhausted.is_set() or (remaining is not None and remaining <= delay):
+        return False
+
+    dprint("Retrying in %.1f seconds..." % delay)
+    time.sleep(delay)
+    return True
+
+def run_once(args, timeout, capture, input_data, cwd, env):
+    """
+    Runs a command a single time, stopping it once its deadline passes.
+    Returns a tuple of the return code, standard output, standard error, and
+    whether the command was stopped for running out of time.
+
+    Keyword Args:
+    args -- the command and arguments to run
+    timeout -- seconds the command may run, or None for no limit
+    capture -- flag to specify if standard output should be captured
+    input_data -- bytes to write to standard input, or None
+    cwd -- directory to run the command in, or None for the current directory
+    env -- variables to add to the environment of the command, or None
+    """
+    remaining = remaining_budget()
+    if budget_exhausted.is_set() or remaining == 0:
+        raise RunBudgetExceededError()
+    if remaining is not None:
+        timeout = remaining if timeout is None else min(timeout, remaining)
+
+    stdin = PIPE if input_data is not None else None
+    stdout = PIPE if capture else outstream
+    if env is not None:
+        env = dict(os.environ, **env)
+    process = Popen(args, stdin=stdin, stdout=stdout, stderr=PIPE, cwd=cwd, env=env)
+    with active_processes_lock:
+        active_processes.add(process)
+        run_stats["commands"] += 1
+
+    timed_out = []
+    def expire():
+        """Stop the command once its deadline passes."""
+        timed_out.append(True)
+        stop_process(process)
+
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+
+    try:
+        output, errors = process.communicate(input_data)
+    finally:
+        if timer:
+            timer.cancel()
+        with active_processes_lock:
+            active_processes.discard(process)
+
+    errors = errors.decode("UTF-8", "replace")
+    errstream.write(errors)
+    if budget_exhausted.is_set():
+        raise RunBudgetExceededError()
+
+    return process.returncode, output, errors, bool(timed_out)
+
+def run_command(args, operation="local", capture=False, check=True, input_data=None, cwd=None, env=None):
+    """
+    Runs a non-interactive command within its operation deadline.
+    Network operations that fail transiently are retried with a jittered
+    exponential backoff. Returns the standard output if capture is set,
+    otherwise the return code.
+
+    Raises CommandTimeoutError if the command exceeds its deadline, and
+    CalledProcessError if it fails while check is set. In both cases the
+    standard error of the command is available as the 'stderr' attribute.
+    Raises RunBudgetExceededError once the run budget is exhausted.
+
+    Keyword Args:
+    args -- the command and arguments to run
+    operation -- optional kind of operation, used to pick the deadline and retry policy
+    capture -- optional flag to specify if standard output should be captured and returned
+    check -- optional flag to specify if a non-zero return code should raise an error
+    input_data -- optional bytes to write to the standard input of the command
+    cwd -- optional directory to run the command in
+    env -- optional variables to add to the environment of the command
+    """
+    timeout = OPERATION_TIMEOUTS.get(operation)
+    attempts = NETWORK_ATTEMPTS if operation == "network" else 1
+
+    attempt = 0
+    while True:
+        attempt += 1
+        returncode, output, errors, timed_out = run_once(args, timeout, capture, input_data, cwd, env)
+        if returncode == 0 and not timed_out:
+            break
+
+        transient = timed_out or is_transient_error(errors)
+        if transient and attempt < attempts and backoff(attempt):
+            vprint("Retrying '" + " ".join(args) + "'...")
+            continue
+
+        if timed_out:
+            error = CommandTimeoutError(returncode, args)
+        elif check:
+            error = CalledProcessError(returncode, args)
+        else:
+            break
+        error.output = output
+        error.stderr = errors
+        raise error
+
+    return output if capture else returncode
+
+def open_url(request, attempts=NETWORK_ATTEMPTS, timeout=HTTP_TIMEOUT):
+    """
+    Opens a url within the HTTP timeout.
+    Requests that fail transiently are retried with a jittered exponential
+    backoff.
+
+    Keyword Args:
+    request -- the url or request object to open
+    attempts -- optional number of attempts to make
+    timeout -- optional number of seconds each attempt may take
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        if budget_exhausted.is_set():
+            raise RunBudgetExceededError()
+
+        attempt_timeout = timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            attempt_timeout = min(attempt_timeout, remaining)
+
+        try:
+            return urllib2.urlopen(request, timeout=attempt_timeout)
+        except urllib2.HTTPError as error:
+            if error.code < 500 or attempt >= attempts or not backoff(attempt):
+                raise
+        except (urllib2.URLError, socket.timeout):
+            if attempt >= attempts or not backoff(attempt):
+                raise
+
+def start_ssh_multiplexing():
+    """
+    Shares a single SSH connection per host between all remote operations in
+    this run, so each git command after the first skips the SSH handshake.
+    The connection options are passed to git through 'GIT_SSH_COMMAND', on
+    top of the command already set there or in 'core.sshCommand', since git
+    ignores 'core.sshCommand' once 'GIT_SSH_COMMAND' is set. The connections
+    are closed when the script exits.
+    """
+    global ssh_control_dir
+    global ssh_base_command
+    global ssh_original_env
+
+    # A custom 'GIT_SSH' program may not accept ssh options
+    if os.name == "nt" or os.environ.get("GIT_SSH"):
+        return
+
+    ssh_original_env = os.environ.get("GIT_SSH_COMMAND")
+    ssh_base_command = os.environ.get("GIT_SSH_COMMAND") or get_git_config("core.sshCommand") or "ssh"
+    ssh_control_dir = tempfile.mkdtemp(prefix="updot-ssh-")
+    control_path = os.path.join(ssh_control_dir, "%r@%h:%p")
+    options = ["-o", "ControlMaster=auto",
+               "-o", "ControlPath=" + control_path,
+               "-o", "ControlPersist=" + str(SSH_CONTROL_PERSIST)]
+    os.environ["GIT_SSH_COMMAND"] = ssh_base_command + " " + " ".join(shell_quote(option) for option in options)
+    dprint("GIT_SSH_COMMAND: " + os.environ["GIT_SSH_COMMAND"])
+    atexit.register(stop_ssh_multiplexing)
+
+def stop_ssh_multiplexing():
+    """Closes the shared SSH connections, and removes their sockets."""
+    global ssh_control_dir
+
+    if ssh_control_dir is None:
+        return
+
+    base_command = shlex.split(ssh_base_command)
+    for name in os.listdir(ssh_control_dir):
+        control_path = os.path.join(ssh_control_dir, name)
+        # The host is required by ssh, but the socket alone identifies the connection
+        call(base_command + ["-o", "ControlPath=" + control_path, "-O", "exit", "updot"],
+             stdout=devnull, stderr=devnull)
+
+    shutil.rmtree(ssh_control_dir, ignore_errors=True)
+    ssh_control_dir = None
+    if ssh_original_env is None:
+        del os.environ["GIT_SSH_COMMAND"]
+    else:
+        os.environ["GIT_SSH_COMMAND"] = ssh_original_env
+
+def ssh_command():
+    """
+    Gets the command to use for running ssh directly, including the options
+    for sharing connections with git.
+    """
+    return shlex.split(os.environ.get("GIT_SSH_COMMAND", "ssh"))
+
 def basic_auth(username, password):
     """
     Compose a basic auth string.
@@ -193,7 +643,7 @@ def post_request(url, data, username):
     max_attempts = 1
     while retries < max_attempts:
         try:
-            response = urllib2.urlopen(request)
+            response = open_url(request)
             dprint("Response:" + response.read().decode("UTF-8"))
             success = True
         except urllib2.HTTPError as error:
@@ -215,6 +665,8 @@ def post_request(url, data, username):
                     continue
 
             success = False
+        except (urllib2.URLError, socket.timeout):
+            success = False
 
         retries += 1
 
@@ -229,7 +681,7 @@ def check_dependencies():
     # Check if git is installed
     vprint("\nChecking for git...")
     try:
-        check_call(["git", "--version"], stdout=outstream, stderr=errstream)
+        run_command(["git", "--version"])
         vprint("Git installation - Okay")
     except (OSError, CalledProcessError):
         sprint("Git not found!")
@@ -241,9 +693,9 @@ def check_dependencies():
     vprint("\nChecking internet connection...")
     try:
         # Try connecting to Google to see if there is an active internet connection
-        urllib2.urlopen('http://www.google.com/', timeout=5)
+        open_url('http://www.google.com/', attempts=1, timeout=CONNECTIVITY_TIMEOUT)
         vprint("Internet connection - Okay")
-    except urllib2.URLError:
+    except (urllib2.URLError, socket.timeout):
         sprint("No internet connection detected!")
         sprint("Check your connection, then rerun this script.")
         sprint("Exiting...")
@@ -269,12 +721,12 @@ def self_update():
     # Check if an update is available
     try:
         # Get remote info
-        check_call(["git", "fetch"], stdout=outstream, stderr=errstream)
+        run_command(["git", "fetch"], "network")
 
         # Get hashes from git to determine if an update is needed
-        local = check_output(["git", "rev-parse", "@"])
-        remote = check_output(["git", "rev-parse", "@{u}"])
-        base = check_output(["git", "merge-base", "@", "@{u}"])
+        local = run_command(["git", "rev-parse", "@"], capture=True)
+        remote = run_command(["git", "rev-parse", "@{u}"], capture=True)
+        base = run_command(["git", "merge-base", "@", "@{u}"], capture=True)
 
         # Check the hashes to see if we need to update
         if local != base:
@@ -282,15 +734,99 @@ def self_update():
         elif local != remote:
             sprint("New version of updot found! Updating...")
             # Update
-            check_call(["git", "pull", "origin", "master"], stdout=outstream, stderr=errstream)
+            run_command(["git", "pull", "origin", "master"], "network")
             sprint("Update successful. Restarting updot...\n\n")
-            # Restart script
+            # Restart script. Exit handlers do not run across exec, so close
+            # the shared SSH connections and restore 'GIT_SSH_COMMAND' first
+            stop_ssh_multiplexing()
             os.execl(sys.executable, *([sys.executable]+sys.argv))
         else:
             sprint("Updot is already up to date!")
     except CalledProcessError:
         sprint("Failed to check for new version of Updot. Try again later.")
 
+def normalize_config_key(key):
+    """
+    Normalizes a git config key for lookups.
+    Section and variable names are case-insensitive, but subsection names are
+    not, so only the first and last parts of the key are lowercased.
+
+    Keyword Args:
+    key -- git config key to normalize
+    """
+    parts = key.split(".")
+    parts[0] = parts[0].lower()
+    parts[-1] = parts[-1].lower()
+    return ".".join(parts)
+
+def load_git_config():
+    """
+    Loads a snapshot of all git config entries with a single git call.
+    The config is read from the dotfiles repository when it exists, so
+    repository entries are included alongside the global ones.
+    Returns a dictionary mapping each key to a list of (value, origin) tuples,
+    in the order git applies them.
+    """
+    global git_config_snapshot
+
+    cwd = DOTFILES_DIR if os.path.exists(DOTFILES_DIR + "/.git") else USER_HOME_DIR
+    try:
+        output = run_command(["git", "config", "--list", "-z", "--show-origin"], capture=True, cwd=cwd)
+    except CalledProcessError:
+        output = b""
+
+    # Entries are separated by NUL characters, and each entry is made up of
+    # its origin followed by its key and value
+    fields = output.decode("UTF-8", "replace").split("\0")
+    snapshot = {}
+    for origin, entry in zip(fields[0::2], fields[1::2]):
+        key, _, value = entry.partition("\n")
+        snapshot.setdefault(normalize_config_key(key), []).append((value, origin))
+
+    git_config_snapshot = snapshot
+    return snapshot
+
+def reset_git_config():
+    """Discards the git config snapshot, so it is reloaded on next use."""
+    global git_config_snapshot
+    git_config_snapshot = None
+
+def get_git_config_all(key):
+    """
+    Gets all values of a git config entry from the snapshot.
+    Returns an empty list if the entry does not exist.
+
+    Keyword Args:
+    key -- git config key to look up
+    """
+    snapshot = git_config_snapshot
+    if snapshot is None:
+        snapshot = load_git_config()
+    return [value for value, _ in snapshot.get(normalize_config_key(key), [])]
+
+def get_git_config(key):
+    """
+    Gets the effective value of a git config entry from the snapshot.
+    Returns None if the entry does not exist.
+
+    Keyword Args:
+    key -- git config key to look up
+    """
+    values = get_git_config_all(key)
+    return values[-1] if values else None
+
+def set_git_config(key, value):
+    """
+    Stores an entry in the global git config, and updates the snapshot in place.
+
+    Keyword Args:
+    key -- git config key to store
+    value -- value to store
+    """
+    run_command(["git", "config", "--global", key, value], check=False)
+    if git_config_snapshot is not None:
+        git_config_snapshot[normalize_config_key(key)] = [(value, "global")]
+
 def get_github_username():
     """
     Gets the GitHub username set in the global git config.
@@ -298,26 +834,17 @@ def get_github_username():
     """
     # Try to get GitHub username from git config
     vprint("\nAttempting to retrieve GitHub username...")
-    github_username = ""
-    try:
-        github_username = check_output(["git", "config", "github.user"])[:-1]
-    except CalledProcessError:
+    github_username = get_git_config("github.user")
+    if github_username is None:
         sprint("GitHub user entry does not exist in git config, creating now...")
-        call(["git", "config", "--global", "github.user", ""], stdout=outstream, stderr=errstream)
+        set_git_config("github.user", "")
+        github_username = ""
 
-    # Decode the username string if needed
-    github_username = github_username.decode(encoding="utf-8", errors="ignore")
     return github_username
 
 def get_git_email():
     """Gets the email set in the global git config."""
-    git_email = ""
-    try:
-        git_email = check_output(["git", "config", "user.email"])[:-1]
-    except CalledProcessError:
-        pass
-
-    return git_email
+    return get_git_config("user.email") or ""
 
 def github_setup():
     """
@@ -328,15 +855,14 @@ def github_setup():
     vprint("\nInspecting local git configuration...")
 
     # Check for user name
-    try:
-        check_call(["git", "config", "user.name"])
+    if get_git_config("user.name") is not None:
         vprint("gitconfig user.name - Okay")
-    except CalledProcessError:
+    else:
         setup_okay = False
         sprint("\nName not found in git config.")
         sprint("Please provide the name you would like associated with your commits (ie. Mike Grimes)")
         git_name = input('Enter Name: ')
-        call(["git", "config", "--global", "user.name", git_name])
+        set_git_config("user.name", git_name)
         sprint("Name stored in git config. Welcome to git, " + git_name + "!")
 
     # Check for email
@@ -348,7 +874,7 @@ def github_setup():
         sprint("\nEmail not found in git config.")
         sprint("Please provide the email you would like associated with your commits.")
         git_email = input('Enter Email: ')
-        call(["git", "config", "--global", "user.email", git_email])
+        set_git_config("user.email", git_email)
         sprint("Email stored to git config.")
 
     # Check if GitHub username has been set
@@ -358,21 +884,35 @@ def github_setup():
         sprint("No GitHub username found. Please provide one now.")
         github_username = input('Enter GitHub username: ')
         sprint("Storing username in git config.")
-        call(["git", "config", "--global", "github.user", github_username], stdout=outstream, stderr=errstream)
+        set_git_config("github.user", github_username)
 
     vprint("GitHub Username: " + github_username)
 
     vprint("\nTrying remote access to GitHub...")
     try:
-        check_output(["ssh", "-T", "git@github.com"], stderr=STDOUT, shell=True)
+        # Batch mode prevents ssh from waiting on prompts for input
+        run_command(ssh_command() + ["-T", "-o", "BatchMode=yes", "git@github.com"], "network", capture=True)
+    except CommandTimeoutError:
+        setup_okay = False
+        sprint("Timed out connecting to GitHub!")
     except CalledProcessError as error:
-        vprint(error.output.decode()[:-1])
-        if "denied" in str(error.output):
+        # GitHub closes authenticated sessions with a non-zero exit status,
+        # so only its greeting marks a successful connection
+        vprint(error.stderr.strip())
+        if "successfully authenticated" in error.stderr:
+            vprint("Connected to GitHub successfully!")
+        elif "denied" in error.stderr:
             setup_okay = False
             sprint("Public key not setup with GitHub!")
             ssh_setup()
+        elif "Host key verification failed" in error.stderr:
+            setup_okay = False
+            sprint("GitHub's host key is not trusted yet!")
+            sprint("Run 'ssh -T git@github.com' once to verify and accept it.")
         else:
-            vprint("Connected to GitHub successfully!")
+            setup_okay = False
+            sprint("Unable to connect to GitHub!")
+            sprint(error.stderr.strip())
 
     return setup_okay
 
@@ -395,7 +935,7 @@ def ssh_setup():
 
         sprint("The following prompts will guide you through creating a new key pair.")
         sprint("(Please leave directory options set to default values)\n")
-        call(["ssh-keygen", "-t", "rsa", "-C", git_email.decode("UTF-8")], shell=True)
+        call(["ssh-keygen", "-t", "rsa", "-C", git_email], shell=True)
 
     vprint("\nAdding to SSH agent...")
     try:
@@ -492,31 +1032,64 @@ def backup_file(file_name, src_path):
         dst_path = os.path.join(BACKUP_DIR, file_name)
         shutil.move(src_path, dst_path)
 
+def parse_manifest_entry(path):
+    """
+    Splits a manifest entry into the pieces needed to link it.
+    Returns a tuple of the target directory, the directory within the dotfiles
+    directory, the file name, and whether the file is a template.
+    Returns None for blank entries.
+
+    Keyword Args:
+    path -- manifest entry to parse
+    """
+    path = path.strip()
+    template = path.startswith(TEMPLATE_PREFIX)
+    if template:
+        path = path[len(TEMPLATE_PREFIX):].strip()
+
+    name = path.split("/")[-1]
+    if not name:
+        return None
+
+    src_dir = path[:len(name) * -1]
+    dst_dir = src_dir
+    src_dir = os.path.join(USER_HOME_DIR, src_dir)
+    if dst_dir and dst_dir[0] == ".":
+        dst_dir = dst_dir[1:]
+
+    return src_dir, dst_dir, name, template
+
 def update_links(files):
     """
     Updates all symlinks to files in the manifest, ensuring they are all valid.
+    Templates are rendered for this host before being linked, and rendered
+    files no longer in the manifest are removed.
 
     Keyword Args:
     files -- paths to files to verify and/or update symlinks for
     """
-    longest_name = 0
-
-    sprint("\nChecking symlinks...\n")
-    for path in files:
-        name = path.split("/")[-1][:-1]
-        longest_name = len(name) if (len(name) > longest_name) else longest_name
-
-        if name and path:
-            path = path.strip("\n")
-            src_dir = path[:len(name) * -1]
+    entries = [entry for entry in map(parse_manifest_entry, files) if entry]
+    run_stats["manifest_size"] = len(entries)
+    longest_name = max([len(entry[2]) for entry in entries] or [0])
 
-            dst_dir = src_dir
-            src_dir = os.path.join(USER_HOME_DIR, src_dir)
-            if dst_dir and dst_dir[0] == ".":
-                dst_dir = dst_dir[1:]
+    # Evict templates no longer in the manifest before linking, so a file that
+    # is now linked directly is not unlinked again after it was checked
+    render_cache = load_render_cache()
+    evict_stale_renders(render_cache, set(get_render_path(dst_dir, name)
+                                          for _, dst_dir, name, template in entries if template))
+    variables = None
 
+    sprint("\nChecking symlinks...\n")
+    for src_dir, dst_dir, name, template in entries:
+        if template:
+            if variables is None:
+                variables = load_template_variables()
+            update_template_link(render_cache, variables, src_dir, dst_dir, name, longest_name)
+        else:
             update_link(src_dir, dst_dir, name, longest_name)
 
+    save_render_cache(render_cache)
+
 def update_link(src_dir, dst_dir, name, output_indent=0):
     """
     Updates the symlink between the provided source and destination paths.
@@ -570,6 +1143,7 @@ def update_link(src_dir, dst_dir, name, output_indent=0):
                 backup_file(name, src_path)
                 sprint(indent_name_space + " - Linking into target directory: " + src_dir)
                 os.symlink(dst_path, src_path)
+                run_stats["link_actions"] += 1
             else:
                 #5: src:link dst:exit => okay
                 sprint(name + indent_space + " - Okay")
@@ -579,12 +1153,14 @@ def update_link(src_dir, dst_dir, name, output_indent=0):
             if not os.path.exists(src_dir):
                 os.makedirs(src_dir)
             os.symlink(dst_path, src_path)
+            run_stats["link_actions"] += 1
     else:
         if os.path.lexists(src_path):
             if os.path.islink(src_path):
                 #6: src:link dst:!exist => delete link
                 sprint(indent_name + " - Removing dead link from target directory: " + src_dir)
                 os.remove(src_path)
+                run_stats["link_actions"] += 1
             else:
                 #3: src:exist dst:!exist => move and link
                 sprint(indent_name + " - Moving to dotfiles directory...")
@@ -596,128 +1172,1003 @@ def update_link(src_dir, dst_dir, name, output_indent=0):
                 shutil.move(src_path, dst_path)
                 sprint(indent_name_space + " - Linking into target directory: " + src_dir)
                 os.symlink(dst_path, src_path)
+                run_stats["link_actions"] += 1
         else:
             #4: src:!exist dst:!exist => warning
             sprint(indent_name + " - Warning: present in manifest, but no remote or local copy exists!")
 
-def repo_setup():
+def load_template_variables():
     """
-    Ensures local and remote git repositories are set up.
-    If no local repo is found, one is initialized.
-    If no remote repo is found on GitHub, one is created use the GitHub API.
+    Loads the variables used to render templates on this host.
+    Variables are read from 'hosts/default.json' in the dotfiles directory,
+    and then overridden by 'hosts/<hostname>.json'. The 'hostname', 'user' and
+    'home' variables are always defined.
+    Returns a tuple of the variables and a hash of their values.
     """
-    # Change to dotfiles repo directory
-    os.chdir(DOTFILES_DIR)
-
-    # Check if dotfiles directory is a git repo
-    vprint("\nVerifying dotfiles directory is a git repository...")
+    hostname = socket.gethostname()
+    variables = {"hostname": hostname, "user": getpass.getuser(), "home": USER_HOME_DIR}
+    for file_name in ["default.json", hostname + ".json"]:
+        path = os.path.join(TEMPLATE_VARIABLES_DIR, file_name)
+        if os.path.isfile(path):
+            with open(path, "r") as variables_file:
+                variables.update(json.load(variables_file))
 
-    if os.path.exists(DOTFILES_DIR + "/.git"):
-        vprint("Dotfiles directory is a git repo!")
-    else:
-        # Init as a local git repo
-        vprint("Dotfiles directory does not contain a git repository.")
-        vprint("Initializing local repository...")
-        call(["git", "init"], stdout=outstream, stderr=errstream)
+    encoded = json.dumps(variables, sort_keys=True).encode("UTF-8")
+    return variables, hashlib.sha1(encoded).hexdigest()
 
-    # Check if remote already added
-    vprint("\nChecking for remote repository...")
+def load_render_cache():
+    """
+    Loads the record of previously rendered templates.
+    The cache maps each rendered file to the hashes of the template and
+    variables it was rendered from, and the path it is linked to.
+    """
     try:
-        check_call(["git", "fetch", "origin", "master"], stdout=outstream, stderr=errstream)
-        vprint("Repository has remote!")
-    except CalledProcessError:
-        vprint("No remote added to repository!")
-        vprint("Adding dotfiles remote...")
-
-        # Check if repo already exists
-        github_username = get_github_username()
-        remote_path = "git@github.com:" + github_username + "/dotfiles.git"
-        try:
-            urllib2.urlopen("http://www.github.com/" + github_username + "/dotfiles")
-            call(["git", "remote", "add", "origin", remote_path], stdout=outstream, stderr=errstream)
-            vprint("Remote added successfully.")
-        except urllib2.HTTPError:
-            sprint("Remote repository does not exist.")
-            sprint("Creating GitHub repository...\n")
+        with open(RENDER_CACHE_PATH, "r") as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
 
-            # Create repo on GitHub
-            url = "https://api.github.com/user/repos"
-            data_dict = {'name': 'dotfiles', 'description': 'My dotfiles repository'}
-            data = json.dumps(data_dict).encode("UTF-8")
-            post_request(url, data, github_username)
+def save_render_cache(render_cache):
+    """
+    Saves the record of rendered templates.
 
-            sprint("\nAdding dotfiles remote...")
-            call(["git", "remote", "add", "origin", remote_path], stdout=outstream, stderr=errstream)
+    Keyword Args:
+    render_cache -- cache of rendered templates to save
+    """
+    if not render_cache and not os.path.exists(RENDER_CACHE_PATH):
+        return
 
-            sprint("\nCreating initial commit...")
-            call(["git", "add", ".", "-A"], stdout=outstream, stderr=errstream)
-            call(["git", "commit", "-m", "\"Initial commit.\""], stdout=outstream, stderr=errstream)
+    if not os.path.exists(RENDER_DIR):
+        os.makedirs(RENDER_DIR)
+    with open(RENDER_CACHE_PATH, "w") as cache_file:
+        json.dump(render_cache, cache_file, indent=2, sort_keys=True)
 
-def get_repo_status(retry=True):
+def render_template(render_cache, variables, template_path, output_path, target_path):
     """
-    Get the current status of tracked dotfiles.
+    Renders a template to the output path, replacing each '{{ name }}'
+    placeholder with the value of the matching variable. Placeholders without
+    a matching variable are left as is.
+    Rendering is skipped if neither the template nor the variables changed
+    since the output was last rendered.
+    Returns True if the template was rendered.
 
     Keyword Args:
-    retry -- optional flag to specify if the status check should be retried on failure
+    render_cache -- cache of rendered templates
+    variables -- tuple of template variables and their hash
+    template_path -- path to the template to render
+    output_path -- path to write the rendered template to
+    target_path -- path the rendered template is linked to
     """
-    try:
-        check_call(["git", "fetch", "origin", "master"], stdout=outstream, stderr=errstream)
-        return check_output(["git", "diff", "origin/master", "HEAD", "--name-status"], stderr=errstream)
-    except CalledProcessError:
-        if retry:
-            check_call(["git", "remote", "update", "--prune"], stdout=outstream, stderr=errstream)
-            check_call(["git", "checkout", "master", "--force"], stdout=outstream, stderr=errstream)
-            return get_repo_status(False)
+    values, variables_hash = variables
+    with open(template_path, "rb") as template_file:
+        template = template_file.read()
+    template_hash = hashlib.sha1(template).hexdigest()
+
+    cached = render_cache.get(output_path)
+    if (cached and cached["template"] == template_hash and
+            cached["variables"] == variables_hash and os.path.exists(output_path)):
+        return False
+
+    def replace(match):
+        """Look up the value for a placeholder."""
+        value = values.get(match.group(1))
+        return match.group(0) if value is None else "%s" % value
+
+    output = TEMPLATE_PLACEHOLDER.sub(replace, template.decode("UTF-8"))
+
+    # Write to a temporary file first so the linked file is never left partial
+    output_dir = os.path.dirname(output_path)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "wb") as output_file:
+        output_file.write(output.encode("UTF-8"))
+    shutil.copymode(template_path, temp_path)
+    os.rename(temp_path, output_path)
+
+    render_cache[output_path] = {
+        "template": template_hash,
+        "variables": variables_hash,
+        "target": target_path,
+    }
+    return True
+
+def get_render_path(dst_dir, name):
+    """
+    Gets the path of the file a template is rendered to for this host.
 
-    return None
+    Keyword Args:
+    dst_dir -- directory of the template within the dotfiles directory
+    name -- name of the file to link
+    """
+    dst_name = name
+    if dst_name[0] == ".":
+        dst_name = dst_name[1:]
 
-def pull_changes():
-    """Check for remote changes, and pull if any are found."""
-    sprint("\nChecking for remote changes...")
+    return os.path.join(RENDER_DIR, dst_dir, dst_name)
 
-    # Only pull if master branch exists
-    remote_branches = check_output(["git", "ls-remote", "--heads", "origin"], stderr=errstream)
-    if "master" in remote_branches.decode("UTF-8"):
-        try:
-            # Check if we need to pull
-            status = get_repo_status()
-            if status is None:
-                sprint("\nUnable to pull changes: Error reaching repository.")
-            elif status:
-                sprint("\nRemote Changes:")
-                parse_print_diff(status)
+def update_template_link(render_cache, variables, src_dir, dst_dir, name, output_indent=0):
+    """
+    Renders a template for this host, and updates the symlink to the rendered
+    file. The template itself is kept in the dotfiles directory, in place of
+    the file it would be linked from otherwise.
+    Returns the path of the rendered file, or None if there is no template.
 
-                sprint("\nPulling most recent revisions from remote repository...")
-                check_call(["git", "pull", "origin", "master"], stdout=outstream, stderr=errstream)
-            else:
-                sprint("\nNo remote changes!")
-        except CalledProcessError:
-            sprint("\nFailed to pull changes.")
-    else:
-        sprint("\nNo remote master found! Not pulling.")
+    Cases Handled:
+    1. The template exists: It is rendered if needed, and the target is linked
+    to the rendered file. An existing file in the target directory is backed up.
+    2. The template does not exist, but a file exists in the target directory:
+    The file is moved to the dotfiles directory as the template, then rendered
+    and linked.
+    3. The template does not exist, and a link exists in the target directory:
+    The dead link is removed.
+    4. Neither the template nor the target exist: A warning is displayed.
 
-def push_changes(commit_message):
+    Keyword Args:
+    render_cache -- cache of rendered templates
+    variables -- tuple of template variables and their hash
+    src_dir -- target directory to link into
+    dst_dir -- directory of the template within the dotfiles directory
+    name -- name of the file to link
+    output_indent -- optional amount of spacing to indent output from this function
+    """
+    indent_space = " " * (output_indent - len(name))
+    indent_name = name + indent_space
+    indent_name_space = " " * len(name) + indent_space
+
+    dst_name = name
+    if dst_name[0] == ".":
+        dst_name = dst_name[1:]
+
+    src_path = os.path.join(src_dir, name)
+    template_path = os.path.join(DOTFILES_DIR, dst_dir, dst_name)
+    output_path = get_render_path(dst_dir, name)
+
+    if not os.path.exists(template_path):
+        if os.path.islink(src_path):
+            #3: template:!exist src:link => delete link
+            sprint(indent_name + " - Removing dead link from target directory: " + src_dir)
+            os.remove(src_path)
+            run_stats["link_actions"] += 1
+            return None
+        elif os.path.exists(src_path):
+            #2: template:!exist src:exist => move and render
+            sprint(indent_name + " - Moving to dotfiles directory as template...")
+            try:
+                os.makedirs(os.path.dirname(template_path))
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+            shutil.move(src_path, template_path)
+            indent_name = indent_name_space
+        else:
+            #4: template:!exist src:!exist => warning
+            sprint(indent_name + " - Warning: present in manifest, but no remote or local copy exists!")
+            return None
+
+    #1: template:exist => render and link
+    if render_template(render_cache, variables, template_path, output_path, src_path):
+        sprint(indent_name + " - Rendered template")
+        indent_name = indent_name_space
+
+    if os.path.islink(src_path):
+        if os.readlink(src_path) == output_path:
+            sprint(indent_name + " - Okay")
+            return output_path
+        os.remove(src_path)
+    elif os.path.exists(src_path):
+        sprint(indent_name + " - Removing from target directory: " + src_dir)
+        backup_file(name, src_path)
+        indent_name = indent_name_space
+    elif not os.path.exists(src_dir):
+        os.makedirs(src_dir)
+
+    sprint(indent_name + " - Linking into target directory: " + src_dir)
+    os.symlink(output_path, src_path)
+    run_stats["link_actions"] += 1
+    return output_path
+
+def evict_stale_renders(render_cache, rendered):
+    """
+    Removes rendered files whose templates are no longer in the manifest,
+    along with any links still pointing to them.
+
+    Keyword Args:
+    render_cache -- cache of rendered templates
+    rendered -- paths of the rendered files whose templates are still in the manifest
+    """
+    for output_path in [path for path in render_cache if path not in rendered]:
+        target_path = render_cache.pop(output_path)["target"]
+        vprint("Removing stale rendered template: " + output_path)
+        if os.path.islink(target_path) and os.readlink(target_path) == output_path:
+            os.remove(target_path)
+            run_stats["link_actions"] += 1
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+def compile_link_plan(files):
+    """
+    Compiles the manifest into a plan that can be applied without reading the
+    manifest again. Paths are stored relative to the home and dotfiles
+    directories, so the plan can be applied on another computer.
+    Returns a dictionary with the compiled manifest entries, and the target
+    and source of each plain link.
+
+    Keyword Args:
+    files -- manifest entries to compile
+    """
+    entries = []
+    links = []
+    for src_dir, dst_dir, name, template in filter(None, map(parse_manifest_entry, files)):
+        target_dir = os.path.relpath(src_dir, USER_HOME_DIR)
+        entries.append([target_dir, dst_dir, name, template])
+        if not template:
+            dst_name = name[1:] if name[0] == "." else name
+            links.append([os.path.normpath(os.path.join(target_dir, name)), os.path.join(dst_dir, dst_name)])
+
+    return {"entries": entries, "links": links}
+
+def export_bundle(bundle_path):
+    """
+    Packages the dotfiles repository, along with the compiled manifest and link
+    plan, into a single archive for bootstrapping computers without network
+    access.
+
+    Keyword Args:
+    bundle_path -- path to write the archive to
+    """
+    bundle_path = os.path.abspath(bundle_path)
+    os.chdir(DOTFILES_DIR)
+
+    sprint("\nExporting dotfiles bundle...")
+    plan = compile_link_plan(read_manifest())
+    plan["version"] = UPDOT_VERSION
+    plan["remote"] = get_git_config("remote.origin.url")
+
+    temp_dir = tempfile.mkdtemp(prefix="updot-bundle-")
+    try:
+        git_bundle_path = os.path.join(temp_dir, BUNDLE_MEMBER)
+        run_command(["git", "bundle", "create", git_bundle_path, "--all"], "bundle")
+
+        plan_path = os.path.join(temp_dir, PLAN_MEMBER)
+        with open(plan_path, "w") as plan_file:
+            json.dump(plan, plan_file, indent=2)
+
+        # The git bundle is already compressed, so the archive is not
+        archive = tarfile.open(bundle_path, "w")
+        try:
+            archive.add(git_bundle_path, BUNDLE_MEMBER)
+            archive.add(plan_path, PLAN_MEMBER)
+        finally:
+            archive.close()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    sprint("Bundle written to " + bundle_path)
+
+def apply_link_plan(plan):
+    """
+    Links every dotfile in a compiled plan into place in one pass.
+    Existing files are backed up, and templates are rendered for this host.
+
+    Keyword Args:
+    plan -- compiled plan, as returned by compile_link_plan
+    """
+    created_dirs = set()
+    linked = 0
+    for target, source in plan["links"]:
+        src_path = os.path.join(USER_HOME_DIR, target)
+        dst_path = os.path.join(DOTFILES_DIR, source)
+        if not os.path.exists(dst_path):
+            sprint(target + " - Warning: present in manifest, but missing from bundle!")
+            continue
+
+        if os.path.islink(src_path):
+            os.remove(src_path)
+        elif os.path.exists(src_path):
+            backup_file(os.path.basename(src_path), src_path)
+
+        src_dir = os.path.dirname(src_path)
+        if src_dir not in created_dirs:
+            if not os.path.exists(src_dir):
+                os.makedirs(src_dir)
+            created_dirs.add(src_dir)
+
+        os.symlink(dst_path, src_path)
+        run_stats["link_actions"] += 1
+        vprint(target + " - Linked")
+        linked += 1
+
+    templates = [entry for entry in plan["entries"] if entry[3]]
+    if templates:
+        render_cache = load_render_cache()
+        variables = load_template_variables()
+        for target_dir, dst_dir, name, _ in templates:
+            src_dir = os.path.join(USER_HOME_DIR, target_dir)
+            if update_template_link(render_cache, variables, src_dir, dst_dir, name):
+                linked += 1
+        save_render_cache(render_cache)
+
+    sprint("Linked " + str(linked) + " dotfiles.")
+
+def bootstrap_from_bundle(bundle_path):
+    """
+    Sets up the dotfiles on a new computer from an archive created by
+    export_bundle, without any network access.
+    The repository is cloned from the bundle, the origin remote is pointed back
+    at the original remote for later fetches, or removed if there was none,
+    and all dotfiles are linked.
+
+    Keyword Args:
+    bundle_path -- path to the archive to bootstrap from
+    """
+    if os.path.exists(DOTFILES_DIR) and os.listdir(DOTFILES_DIR):
+        sprint("Error: Dotfiles directory already exists! Not bootstrapping.")
+        return
+
+    sprint("\nBootstrapping dotfiles from bundle...")
+    temp_dir = tempfile.mkdtemp(prefix="updot-bundle-")
+    try:
+        # Only extract the expected members, so the archive cannot write
+        # anywhere else
+        try:
+            archive = tarfile.open(bundle_path, "r")
+            try:
+                for member in [BUNDLE_MEMBER, PLAN_MEMBER]:
+                    source = archive.extractfile(member)
+                    if source is None:
+                        raise KeyError(member)
+                    with open(os.path.join(temp_dir, member), "wb") as destination:
+                        shutil.copyfileobj(source, destination)
+            finally:
+                archive.close()
+        except (tarfile.TarError, KeyError):
+            sprint("Error: " + bundle_path + " is not an updot bundle! Not bootstrapping.")
+            return
+        except IOError as error:
+            sprint("Error: Unable to read bundle: " + str(error))
+            return
+
+        with open(os.path.join(temp_dir, PLAN_MEMBER), "r") as plan_file:
+            plan = json.load(plan_file)
+
+        vprint("Cloning dotfiles repository from bundle...")
+        run_command(["git", "clone", "--branch", "master", os.path.join(temp_dir, BUNDLE_MEMBER), DOTFILES_DIR], "bundle")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Without an original remote, drop the origin remote rather than leave it
+    # pointing at the deleted bundle
+    os.chdir(DOTFILES_DIR)
+    if plan.get("remote"):
+        vprint("Reattaching origin remote: " + plan["remote"])
+        run_command(["git", "remote", "set-url", "origin", plan["remote"]])
+    else:
+        vprint("No original remote recorded in bundle. Removing origin remote.")
+        run_command(["git", "remote", "remove", "origin"])
+    reset_git_config()
+
+    apply_link_plan(plan)
+
+def get_stat_signature(path):
+    """
+    Gets a signature of a file from its metadata, which changes whenever the
+    file is modified. Returns None if the file was modified too recently for
+    its modification time to be trusted.
+
+    Keyword Args:
+    path -- path to the file
+    """
+    stat = os.stat(path)
+    if time.time() - stat.st_mtime < 2:
+        return None
+    return [stat.st_size, repr(stat.st_mtime), stat.st_ino, stat.st_dev]
+
+def hash_files(paths):
+    """
+    Gets the git blob hash of each file, so copies can be compared with the
+    dotfiles they came from without reading both.
+    Hashes are cached by the stat signature of each file, and the remaining
+    files are hashed in parallel batches, each by a single
+    'git hash-object --stdin-paths' process.
+    Returns a dictionary mapping each path to its hash.
+
+    Keyword Args:
+    paths -- paths of the files to hash
+    """
+    try:
+        with open(VERIFY_CACHE_PATH, "r") as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, ValueError):
+        cache = {}
+
+    hashes = {}
+    signatures = {}
+    uncached = []
+    for path in set(paths):
+        signatures[path] = get_stat_signature(path)
+        cached = cache.get(path)
+        if cached and signatures[path] and cached[0] == signatures[path]:
+            hashes[path] = cached[1]
+        else:
+            uncached.append(path)
+
+    dprint("Hashing " + str(len(uncached)) + " files, " + str(len(hashes)) + " cached")
+    if uncached:
+        batch_size = max(HASH_BATCH_MIN, -(-len(uncached) // HASH_WORKERS))
+        batches = [uncached[index:index + batch_size] for index in range(0, len(uncached), batch_size)]
+        results = queue.Queue()
+
+        def worker(batch):
+            """
+            Hash a batch of files with a single git process.
+            A result is always queued, so the caller never waits forever.
+            """
+            hashed = []
+            budget_error = None
+            try:
+                # Filters are skipped so hashes do not depend on the repository config
+                output = run_command(["git", "hash-object", "--no-filters", "--stdin-paths"], capture=True,
+                                     input_data="\n".join(batch).encode("UTF-8") + b"\n")
+                hashed = list(zip(batch, output.decode("UTF-8").split()))
+            except RunBudgetExceededError as error:
+                budget_error = error
+            except (CalledProcessError, OSError, ValueError) as error:
+                vprint("Failed to hash files: " + str(error))
+            finally:
+                results.put((hashed, budget_error))
+
+        threads = []
+        for batch in batches:
+            thread = threading.Thread(target=worker, args=(batch,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        budget_error = None
+        for _ in batches:
+            hashed, error = results.get()
+            budget_error = budget_error or error
+            for path, blob_hash in hashed:
+                hashes[path] = blob_hash
+                if signatures[path]:
+                    cache[path] = [signatures[path], blob_hash]
+
+        try:
+            with open(VERIFY_CACHE_PATH, "w") as cache_file:
+                json.dump(cache, cache_file)
+        except IOError:
+            vprint("Failed to save hash cache.")
+
+        # Stop the run once the budget is exhausted, as the other commands do
+        if budget_error:
+            raise budget_error
+
+    return hashes
+
+def print_file_diff(expected_path, actual_path):
+    """
+    Prints the differences between a dotfile and a copy of it.
+
+    Keyword Args:
+    expected_path -- path to the dotfile in the dotfiles directory
+    actual_path -- path to the copy
+    """
+    with open(expected_path, "rb") as expected_file:
+        expected = expected_file.read()
+    with open(actual_path, "rb") as actual_file:
+        actual = actual_file.read()
+
+    if b"\0" in expected or b"\0" in actual:
+        sprint("Binary files differ")
+        return
+
+    diff = difflib.unified_diff(expected.decode("UTF-8", "replace").splitlines(True),
+                                actual.decode("UTF-8", "replace").splitlines(True),
+                                expected_path, actual_path)
+    for line in diff:
+        sprint(line, end="" if line.endswith("\n") else "\n")
+
+def verify_links(files):
+    """
+    Checks that every dotfile in the manifest is still linked into place.
+    Dotfiles that were replaced by a regular copy are compared with the version
+    in the dotfiles directory by hash, and the differences of any copy that has
+    drifted are shown.
+    Returns True if every dotfile is linked, or is an identical copy.
+
+    Keyword Args:
+    files -- manifest entries to verify
+    """
+    entries = [entry for entry in map(parse_manifest_entry, files) if entry]
+    longest_name = 0
+    problems = []
+    copies = []
+
+    sprint("\nVerifying symlinks...\n")
+    for src_dir, dst_dir, name, template in entries:
+        dst_name = name[1:] if name[0] == "." else name
+        src_path = os.path.join(src_dir, name)
+        if template:
+            dst_path = os.path.join(RENDER_DIR, dst_dir, dst_name)
+        else:
+            dst_path = os.path.join(DOTFILES_DIR, dst_dir, dst_name)
+
+        target = os.path.relpath(src_path, USER_HOME_DIR)
+        longest_name = max(longest_name, len(target))
+        if os.path.islink(src_path):
+            if os.readlink(src_path) != dst_path:
+                problems.append((target, "Linked elsewhere: " + os.readlink(src_path)))
+            elif not os.path.exists(dst_path):
+                problems.append((target, "Dangling link: " + dst_path + " no longer exists"))
+        elif not os.path.exists(src_path):
+            problems.append((target, "Missing"))
+        elif not os.path.isfile(dst_path):
+            problems.append((target, "Not a link, and not in dotfiles directory"))
+        else:
+            copies.append((target, src_path, dst_path))
+
+    hashes = hash_files([path for _, src_path, dst_path in copies for path in [src_path, dst_path]])
+    drifted = []
+    for target, src_path, dst_path in copies:
+        if src_path not in hashes or dst_path not in hashes:
+            problems.append((target, "Unable to compare copy"))
+        elif hashes[src_path] == hashes[dst_path]:
+            problems.append((target, "Replaced by an identical copy"))
+        else:
+            problems.append((target, "Replaced by a modified copy"))
+            drifted.append((src_path, dst_path))
+
+    for target, problem in problems:
+        sprint(target + " " * (longest_name - len(target)) + " - " + problem)
+
+    for src_path, dst_path in drifted:
+        sprint("")
+        print_file_diff(dst_path, src_path)
+
+    if not problems:
+        sprint("All " + str(len(entries)) + " dotfiles are linked.")
+    else:
+        sprint("\n" + str(len(problems)) + " of " + str(len(entries)) + " dotfiles are not linked. "
+               "Run with --relink to fix them.")
+
+    return not drifted and all(problem == "Replaced by an identical copy" for _, problem in problems)
+
+def repo_setup():
+    """
+    Ensures local and remote git repositories are set up.
+    If no local repo is found, one is initialized.
+    If no remote repo is found on GitHub, one is created use the GitHub API.
+    """
+    # Change to dotfiles repo directory
+    os.chdir(DOTFILES_DIR)
+
+    # Check if dotfiles directory is a git repo
+    vprint("\nVerifying dotfiles directory is a git repository...")
+
+    if os.path.exists(DOTFILES_DIR + "/.git"):
+        vprint("Dotfiles directory is a git repo!")
+    else:
+        # Init as a local git repo
+        vprint("Dotfiles directory does not contain a git repository.")
+        vprint("Initializing local repository...")
+        run_command(["git", "init"], check=False)
+        reset_git_config()
+
+    # Check if remote already added
+    vprint("\nChecking for remote repository...")
+    try:
+        run_command(["git", "fetch", "origin", "master"], "network")
+        vprint("Repository has remote!")
+    except CalledProcessError:
+        vprint("No remote added to repository!")
+        vprint("Adding dotfiles remote...")
+
+        # Check if repo already exists
+        github_username = get_github_username()
+        remote_path = "git@github.com:" + github_username + "/dotfiles.git"
+        try:
+            open_url("http://www.github.com/" + github_username + "/dotfiles")
+            run_command(["git", "remote", "add", "origin", remote_path], check=False)
+            reset_git_config()
+            vprint("Remote added successfully.")
+        except urllib2.HTTPError:
+            sprint("Remote repository does not exist.")
+            sprint("Creating GitHub repository...\n")
+
+            # Create repo on GitHub
+            url = "https://api.github.com/user/repos"
+            data_dict = {'name': 'dotfiles', 'description': 'My dotfiles repository'}
+            data = json.dumps(data_dict).encode("UTF-8")
+            post_request(url, data, github_username)
+
+            sprint("\nAdding dotfiles remote...")
+            run_command(["git", "remote", "add", "origin", remote_path], check=False)
+            reset_git_config()
+
+            sprint("\nCreating initial commit...")
+            run_command(["git", "add", ".", "-A"], check=False)
+            run_command(["git", "commit", "-m", "\"Initial commit.\""], check=False)
+
+def get_remotes():
+    """
+    Gets the names of the remotes the dotfiles are synced with.
+    Remotes are read from 'updot.remote' entries in the dotfiles repository
+    config, and the first entry is treated as the primary remote.
+    Falls back to 'origin' if none are configured.
+    """
+    remotes = [remote.strip() for remote in get_git_config_all("updot.remote") if remote.strip()]
+    return remotes or [DEFAULT_REMOTE]
+
+def run_on_remotes(build_command, remotes):
+    """
+    Runs a network command against several remotes concurrently.
+    Yields a tuple of the remote name, whether the command succeeded, and its
+    error output as each remote finishes, so a slow remote never delays the
+    others. Each remote is bound by the network operation deadline.
+
+    Keyword Args:
+    build_command -- function taking a remote name and returning the command to run
+    remotes -- names of the remotes to run the command against
+    """
+    results = queue.Queue()
+
+    def worker(remote):
+        """Run the command for a single remote and queue its result."""
+        try:
+            run_command(build_command(remote), "network")
+            results.put((remote, True, ""))
+        except CommandTimeoutError:
+            timeout = str(OPERATION_TIMEOUTS["network"])
+            results.put((remote, False, "Timed out after " + timeout + " seconds"))
+        except CalledProcessError as error:
+            results.put((remote, False, error.stderr.strip()))
+        except RunBudgetExceededError:
+            results.put((remote, False, "Cancelled: run budget exhausted"))
+        except OSError as error:
+            results.put((remote, False, str(error)))
+
+    for remote in remotes:
+        thread = threading.Thread(target=worker, args=(remote,))
+        thread.daemon = True
+        thread.start()
+
+    for _ in remotes:
+        yield results.get()
+
+def report_remote_results(results, remotes, until=None):
+    """
+    Prints the result for each remote as it arrives.
+    Returns a dictionary mapping each remote name to a tuple of whether it
+    succeeded and its error output.
+
+    Keyword Args:
+    results -- iterator of results, as produced by run_on_remotes
+    remotes -- names of all remotes being reported on
+    until -- optional remote to stop after, leaving later results in the iterator
+    """
+    longest_name = max(len(remote) for remote in remotes)
+    reported = {}
+    for remote, success, output in results:
+        indent_space = " " * (longest_name - len(remote))
+        if success:
+            sprint(remote + indent_space + " - Okay")
+        else:
+            sprint(remote + indent_space + " - Failed")
+            if output:
+                vprint(output)
+        reported[remote] = (success, output)
+        if remote == until:
+            break
+
+    return reported
+
+def report_mirror_fetches(results, remotes):
+    """
+    Reports the results of mirror fetches in the background, so a slow mirror
+    never delays the sync with the primary remote.
+
+    Keyword Args:
+    results -- iterator of the remaining results, as produced by run_on_remotes
+    remotes -- names of all remotes being reported on
+    """
+    global mirror_fetches
+
+    mirror_fetches = threading.Thread(target=report_remote_results, args=(results, remotes))
+    mirror_fetches.daemon = True
+    mirror_fetches.start()
+
+def get_repo_status(remote=DEFAULT_REMOTE, retry=True, fetch=True):
+    """
+    Get the current status of tracked dotfiles.
+    Transient network failures are already retried by the command runner, so
+    other failures are only retried once after pruning stale remote refs.
+    The working tree is never touched, since it may hold uncommitted changes.
+    Returns None if the status could not be determined.
+
+    Keyword Args:
+    remote -- optional name of the remote to compare against
+    retry -- optional flag to specify if the status check should be retried on failure
+    fetch -- optional flag to specify if the remote should be fetched first
+    """
+    try:
+        if fetch:
+            run_command(["git", "fetch", remote, "master"], "network")
+        return run_command(["git", "diff", remote + "/master", "HEAD", "--name-status"], capture=True)
+    except CommandTimeoutError:
+        vprint("Timed out checking repository status.")
+    except CalledProcessError as error:
+        vprint(error.stderr.strip())
+        if retry and not is_transient_error(error.stderr):
+            run_command(["git", "fetch", "--prune", remote], "network")
+            return get_repo_status(remote, False)
+
+    return None
+
+def pull_changes():
+    """
+    Check for remote changes, and pull if any are found.
+    All remotes are fetched concurrently, but changes are only pulled from the
+    primary remote.
+    """
+    sprint("\nChecking for remote changes...")
+
+    remotes = get_remotes()
+    primary = remotes[0]
+
+    # Only pull if master branch exists
+    remote_branches = run_command(["git", "ls-remote", "--heads", primary], "network", capture=True)
+    if "master" in remote_branches.decode("UTF-8"):
+        try:
+            vprint("\nFetching remotes...")
+            fetch_results = run_on_remotes(lambda remote: ["git", "fetch", remote, "master"], remotes)
+            fetched = report_remote_results(fetch_results, remotes, until=primary)
+
+            # Continue with the primary right away, and report the remaining
+            # mirrors as they finish
+            if len(fetched) < len(remotes):
+                report_mirror_fetches(fetch_results, remotes)
+
+            # Check if we need to pull
+            status = get_repo_status(primary, fetch=not fetched[primary][0])
+            if status is None:
+                sprint("\nUnable to pull changes: Error reaching repository.")
+            elif status:
+                sprint("\nRemote Changes:")
+                parse_print_diff(status)
+
+                sprint("\nPulling most recent revisions from remote repository...")
+                run_command(["git", "pull", primary, "master"], "network")
+            else:
+                sprint("\nNo remote changes!")
+        except CalledProcessError:
+            sprint("\nFailed to pull changes.")
+    else:
+        sprint("\nNo remote master found! Not pulling.")
+
+def is_push_rejected(output):
+    """
+    Checks if a push failed because the remote has changes that are not
+    present locally.
+
+    Keyword Args:
+    output -- error output from the failed push
+    """
+    return any(marker in output for marker in ["[rejected]", "non-fast-forward", "fetch first"])
+
+def push_changes(commit_message):
     """
     Add, commit, and push all changes to the dotfiles.
+    Changes are pushed to the primary remote first. If that push is rejected
+    because another computer pushed first, the local commits are rebased onto
+    the primary remote and the push is retried after a randomized delay.
+    Mirrors are only pushed to, concurrently, once the primary has accepted
+    the final commits, so they never receive commits that are later rebased.
 
     Keyword Args:
     commit_message -- message to use as the commit message for this update
     """
-    call(["git", "add", ".", "-A"], stdout=outstream, stderr=errstream)
+    run_command(["git", "add", ".", "-A"], check=False)
 
-    status = check_output(["git", "diff", "--name-status", "--cached"], stderr=errstream)
+    status = run_command(["git", "diff", "--name-status", "--cached"], capture=True)
     if status:
         sprint("\nLocal Changes:")
         parse_print_diff(status)
         sprint("\nPushing updates to remote repository...")
         try:
-            check_call(["git", "commit", "-m", commit_message], stdout=outstream, stderr=errstream)
-            check_call(["git", "push", "origin", "master"], stdout=outstream, stderr=errstream)
+            run_command(["git", "commit", "-m", commit_message])
         except CalledProcessError:
             sprint("Error: Failed to push changes!")
+            return
+
+        remotes = get_remotes()
+        primary = remotes[0]
+        mirrors = remotes[1:]
+        push_command = lambda remote: ["git", "push", remote, "master"]
+        pushed = report_remote_results(run_on_remotes(push_command, [primary]), remotes)
+
+        attempt = 1
+        while attempt < PUSH_ATTEMPTS:
+            success, output = pushed[primary]
+            if success or not is_push_rejected(output) or not backoff(attempt):
+                break
+            attempt += 1
+
+            sprint("\nPush rejected. Rebasing onto remote changes and retrying...")
+            try:
+                run_command(["git", "pull", "--rebase", primary, "master"], "network")
+            except CalledProcessError:
+                run_command(["git", "rebase", "--abort"], check=False)
+                sprint("Error: Failed to rebase onto remote changes!")
+                break
+            pushed = report_remote_results(run_on_remotes(push_command, [primary]), remotes)
+
+        if not pushed[primary][0]:
+            sprint("Error: Failed to push changes!")
+            return
+
+        if mirrors:
+            # Let mirror fetches finish first, so they do not race the pushes
+            # to update the same remote-tracking refs
+            if mirror_fetches:
+                mirror_fetches.join()
+            pushed = report_remote_results(run_on_remotes(push_command, mirrors), remotes)
+            if not all(success for success, _ in itervalues(pushed)):
+                sprint("Warning: Failed to push changes to some mirrors!")
     else:
         sprint("\nNo changes to push!")
 
+def get_repo_health():
+    """
+    Inspects the object store of the dotfiles repository.
+    Reads the object directories directly rather than forking git, so it is
+    cheap enough to run on every sync.
+    Returns a dictionary with the loose object count, the pack count, and
+    whether a commit-graph and multi-pack-index exist.
+    """
+    loose_objects = 0
+    packs = 0
+    if os.path.isdir(OBJECTS_DIR):
+        for name in os.listdir(OBJECTS_DIR):
+            # Loose objects are stored in directories named by the first two
+            # characters of their hash
+            if len(name) == 2:
+                loose_objects += len(os.listdir(os.path.join(OBJECTS_DIR, name)))
+
+        pack_dir = os.path.join(OBJECTS_DIR, "pack")
+        if os.path.isdir(pack_dir):
+            packs = len([name for name in os.listdir(pack_dir) if name.endswith(".pack")])
+
+    info_dir = os.path.join(OBJECTS_DIR, "info")
+    commit_graph = (os.path.exists(os.path.join(info_dir, "commit-graph")) or
+                    os.path.exists(os.path.join(info_dir, "commit-graphs", "commit-graph-chain")))
+    multi_pack_index = os.path.exists(os.path.join(OBJECTS_DIR, "pack", "multi-pack-index"))
+
+    return {
+        "loose_objects": loose_objects,
+        "packs": packs,
+        "commit_graph": commit_graph,
+        "multi_pack_index": multi_pack_index,
+    }
+
+def needs_maintenance(health):
+    """
+    Checks if the dotfiles repository has crossed any maintenance threshold,
+    and has not been maintained recently.
+
+    Keyword Args:
+    health -- repository health, as returned by get_repo_health
+    """
+    try:
+        if time.time() - os.path.getmtime(MAINTENANCE_STAMP_PATH) < MAINTENANCE_INTERVAL:
+            return False
+    except OSError:
+        pass
+
+    return (health["loose_objects"] >= LOOSE_OBJECT_THRESHOLD or
+            health["packs"] >= PACK_THRESHOLD or
+            not health["commit_graph"])
+
+def schedule_maintenance():
+    """
+    Starts repository maintenance in the background if the dotfiles repository
+    needs it. The maintenance process is detached, so the current run never
+    waits on it.
+    """
+    if not os.path.isdir(OBJECTS_DIR):
+        return
+
+    health = get_repo_health()
+    dprint("\nRepository health: " + json.dumps(health, sort_keys=True))
+    if not needs_maintenance(health):
+        return
+
+    vprint("\nScheduling repository maintenance in the background...")
+    # Detach from the terminal so maintenance survives the shell exiting.
+    # Other threads may be running, so the new session is only started from a
+    # preexec function on Python 2, which has no safer way to do it
+    kwargs = {}
+    if sys.version_info[0] >= 3:
+        kwargs["start_new_session"] = True
+    elif hasattr(os, "setsid"):
+        kwargs["preexec_fn"] = os.setsid
+    try:
+        with open(os.devnull, "r") as null_input:
+            Popen([sys.executable, os.path.realpath(__file__), "--maintain"],
+                  stdin=null_input, stdout=devnull, stderr=devnull, cwd=DOTFILES_DIR,
+                  close_fds=True, **kwargs)
+    except OSError:
+        vprint("Failed to start repository maintenance.")
+
+def acquire_maintenance_lock():
+    """
+    Takes the maintenance lock, clearing it first if it was abandoned.
+    Returns False if another maintenance run holds the lock.
+    """
+    try:
+        if time.time() - os.path.getmtime(MAINTENANCE_LOCK_PATH) > MAINTENANCE_LOCK_TIMEOUT:
+            os.remove(MAINTENANCE_LOCK_PATH)
+    except OSError:
+        pass
+
+    try:
+        os.close(os.open(MAINTENANCE_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+        return False
+
+def maintain_repo():
+    """
+    Runs incremental maintenance on the dotfiles repository.
+    Packs are combined with a geometric repack, which only rewrites the
+    smallest packs, and the commit-graph and multi-pack-index are rewritten to
+    keep history walks and object lookups fast.
+    """
+    if not acquire_maintenance_lock():
+        vprint("Repository maintenance already running.")
+        return
+
+    try:
+        sprint("\nMaintaining dotfiles repository...")
+        try:
+            run_command(["git", "repack", "-d", "--geometric=2"], "maintenance")
+        except CalledProcessError:
+            # Geometric repacking requires git 2.32 or newer
+            vprint("Geometric repack unavailable, falling back to 'git gc --auto'.")
+            run_command(["git", "gc", "--auto", "--quiet"], "maintenance", check=False)
+
+        try:
+            run_command(["git", "commit-graph", "write", "--reachable", "--split"], "maintenance")
+            run_command(["git", "multi-pack-index", "write"], "maintenance")
+        except CalledProcessError:
+            vprint("Failed to write commit-graph or multi-pack-index.")
+
+        # Record the run so maintenance is not rescheduled too often
+        open(MAINTENANCE_STAMP_PATH, "w").close()
+        vprint("Repository health: " + json.dumps(get_repo_health(), sort_keys=True))
+    finally:
+        os.remove(MAINTENANCE_LOCK_PATH)
+
+def get_object_store_size():
+    """
+    Gets the total size in bytes of the dotfiles repository object store, with
+    a single git call. Returns None if the size cannot be measured, including
+    while maintenance may be repacking the object store.
+    """
+    if not os.path.isdir(OBJECTS_DIR) or os.path.exists(MAINTENANCE_LOCK_PATH):
+        return None
+
+    try:
+        output = run_command(["git", "count-objects", "-v"], capture=True, cwd=DOTFILES_DIR)
+    except CalledProcessError:
+        return None
+
+    # Sizes of loose objects and packs are reported in KiB
+    counts = dict(line.split(": ", 1) for line in output.decode("UTF-8").splitlines() if ": " in line)
+    return (int(counts.get("size", 0)) + int(counts.get("size-pack", 0))) * 1024
+
 def check_readme():
     """Check if a readme exists, and create a default one if not."""
     # Check for a readme, and create one if one doesn't exist
@@ -732,7 +2183,7 @@ def check_readme():
         readme.write("Created and maintained by the awesome 'updot.py' script!\n\n")
         readme.write("Get the script for yourself here: https://github.com/ntpeters/updot\n")
         readme.close()
-        call(["git", "add", DOTFILES_DIR + "/README.md"], stdout=outstream, stderr=errstream)
+        run_command(["git", "add", DOTFILES_DIR + "/README.md"], check=False)
 
 
 def read_manifest():
@@ -754,9 +2205,11 @@ def parse_print_diff(diff_string):
     format.
 
     Keyword Args:
-    diff_string -- git diff status string to process
+    diff_string -- git diff status string to process, as bytes or text
     """
-    file_statuses = diff_string.decode('UTF-8').split("\n")
+    if isinstance(diff_string, bytes):
+        diff_string = diff_string.decode('UTF-8')
+    file_statuses = diff_string.split("\n")
 
     status_dict = {}
     longest_status = 0
@@ -788,57 +2241,629 @@ def parse_print_diff(diff_string):
 
         sprint(line)
 
-def get_status():
-    """Display the status of local and remote dotfiles."""
+def porcelain_to_name_status(porcelain):
+    """
+    Converts 'git status --porcelain' output to the format of
+    'git diff --name-status', with untracked files shown as added.
+
+    Keyword Args:
+    porcelain -- output of 'git status --porcelain'
+    """
+    lines = []
+    for line in porcelain.split("\n"):
+        if not line:
+            continue
+        index_code, tree_code, path = line[0], line[1], line[3:]
+        if index_code == "?":
+            code = "A"
+        elif index_code != " ":
+            code = index_code
+        else:
+            code = tree_code
+        lines.append(code + "\t" + path + "\n")
+
+    return "".join(lines)
+
+def collect_status(fetch=True):
+    """
+    Collects the status of local and remote dotfiles.
+    Returns a dictionary with the 'local' and 'remote' git diff statuses, where
+    a status is None if it could not be determined.
+
+    Keyword Args:
+    fetch -- optional flag to specify if the remote should be fetched first
+    """
+    status = {"local": None, "remote": None}
+
+    # Get local status without writing to the index, so status checks never
+    # take the index lock away from a concurrent sync
+    try:
+        output = run_command(["git", "status", "--porcelain", "--untracked-files=all"], capture=True,
+                             env={"GIT_OPTIONAL_LOCKS": "0"})
+        status["local"] = porcelain_to_name_status(output.decode("UTF-8"))
+    except CalledProcessError:
+        pass
+
+    # Get remote status against the primary remote
+    primary = get_remotes()[0]
+    try:
+        if fetch:
+            run_command(["git", "fetch", primary], "network")
+        remote = run_command(["git", "diff", primary + "/master", "HEAD", "--name-status"], capture=True)
+        status["remote"] = remote.decode("UTF-8")
+    except CalledProcessError:
+        pass
+
+    return status
 
+def print_status(status):
+    """
+    Displays the status of local and remote dotfiles.
+    Returns True if any changes were found.
+
+    Keyword Args:
+    status -- dictionary of local and remote statuses, as returned by collect_status
+    """
     # Track if any errors occur
     error_detected = False
     # Track if changes were detected
     changes_found = False
 
+    if status["local"] is None:
+        error_detected = True
+        sprint("\nError: Unable to get local status")
+    elif status["local"]:
+        sprint("\nLocal Dotfiles Status:")
+        parse_print_diff(status["local"])
+        changes_found = True
+    else:
+        sprint("\nNo local changes!")
+
+    if status["remote"] is None:
+        error_detected = True
+        sprint("\nError: Unable to get remote status")
+    elif status["remote"]:
+        sprint("\nRemote Dotfiles Status:")
+        parse_print_diff(status["remote"])
+        changes_found = True
+    else:
+        sprint("\nNo remote changes!")
+
+    if error_detected:
+        raise DotfileStatusError
+
+    return changes_found
+
+def get_status(use_daemon=False, sync_started=None):
+    """
+    Display the status of local and remote dotfiles.
+
+    Keyword Args:
+    use_daemon -- optional flag to specify if a running status daemon, or the
+    status recorded by the last sync, should be used first
+    sync_started -- optional start time of the sync holding the lock, to record
+    the collected status for concurrent status checks
+    """
     # Ensure the dotfiles directory exist
-    if os.path.exists(DOTFILES_DIR):
+    if not os.path.exists(DOTFILES_DIR):
+        sprint("\nWarning: Dotfiles directory does not exist. Skipping status check.")
+        return True
+
+    status = None
+    if use_daemon:
+        status = query_status_daemon()
+        if status:
+            dprint("\nStatus provided by daemon.")
+        else:
+            status = read_cached_status()
+            if status:
+                dprint("\nStatus provided by last sync.")
+
+    if status is None:
         os.chdir(DOTFILES_DIR)
+        status = collect_status()
+        if sync_started is not None:
+            write_sync_result(sync_started, "syncing", status)
+
+    return print_status(status)
+
+def sync_in_progress(result=None):
+    """
+    Checks if another run currently holds the sync lock.
+    The lock holder records its pid when it takes the lock, so this checks
+    that the recorded run is still alive rather than probing the lock, which
+    could make a sync starting at the same time think it is already taken.
+
+    Keyword Args:
+    result -- optional sync result already read by the caller
+    """
+    if fcntl is None:
+        return False
+
+    if result is None:
+        result = read_sync_result()
+    if not result or result["outcome"] != "syncing":
+        return False
+
+    try:
+        os.kill(result["pid"], 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+    return True
+
+def read_sync_result():
+    """
+    Reads the result recorded by the last sync.
+    Returns None if no result has been recorded.
+    """
+    try:
+        with open(SYNC_RESULT_PATH, "r") as result_file:
+            return json.load(result_file)
+    except (IOError, ValueError):
+        return None
+
+def write_sync_result(started, outcome, status):
+    """
+    Records the result of a sync, for concurrent runs to reuse.
+    The result is written to a temporary file first, so readers never see a
+    partial result.
 
-        # Get local status
+    Keyword Args:
+    started -- time the sync started
+    outcome -- short description of how the sync ended
+    status -- status of local and remote dotfiles after the sync
+    """
+    result = {
+        "pid": os.getpid(),
+        "started": started,
+        "finished": time.time(),
+        "outcome": outcome,
+        "status": status,
+    }
+    temp_path = SYNC_RESULT_PATH + ".tmp"
+    try:
+        with open(temp_path, "w") as result_file:
+            json.dump(result, result_file)
+        os.rename(temp_path, SYNC_RESULT_PATH)
+    except (IOError, OSError):
+        vprint("Failed to record sync result.")
+
+def read_cached_status():
+    """
+    Gets the status recorded by the last sync, if it can be reused.
+    While another sync is running, only the status it recorded before syncing
+    is reused, as anything older may predate it. Otherwise the status is reused
+    for a short time after it was recorded. Returns None if it cannot be reused.
+    """
+    result = read_sync_result()
+    if not result or not result.get("status"):
+        return None
+
+    if sync_in_progress(result):
+        return result["status"]
+    if time.time() - result["finished"] < STATUS_CACHE_TTL:
+        return result["status"]
+    return None
+
+def acquire_sync_lock(coalesce):
+    """
+    Takes the sync lock, so only one run syncs the dotfiles at a time.
+    If another run holds the lock, this either exits right away, or waits for
+    it to finish and reuses its result when there is nothing left to sync.
+    Returns the open lock file, which holds the lock until the script exits,
+    or None if locking is unavailable.
+
+    Keyword Args:
+    coalesce -- 'wait' to wait for a concurrent sync, or 'exit' to exit right away
+    """
+    if fcntl is None or not os.path.exists(os.path.dirname(SYNC_LOCK_PATH)):
+        return None
+
+    lock_file = open(SYNC_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except IOError:
+        pass
+
+    if coalesce == "exit":
+        sprint("\nAnother updot run is in progress. Exiting...")
+        exit()
+
+    sprint("\nWaiting for another updot run to finish...")
+    waiting_since = time.time()
+    deadline = waiting_since + COALESCE_TIMEOUT
+    while True:
         try:
-            # Mark all untracked files with 'intent to add'
-            check_call(["git", "add", "-N", "."], stdout=outstream, stderr=errstream)
-            status = check_output(["git", "diff", "--name-status"])
-            status += check_output(["git", "diff", "--name-status", "--cached"])
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except IOError:
+            if time.time() >= deadline or budget_exhausted.is_set():
+                sprint("Timed out waiting for the other run. Exiting...")
+                exit()
+            time.sleep(0.2)
 
-            if status:
-                sprint("\nLocal Dotfiles Status:")
-                parse_print_diff(status)
-                changes_found = True
-            else:
-                sprint("\nNo local changes!")
-        except CalledProcessError:
-            error_detected = True
-            sprint("\nError: Unable to get local status")
+    # Reuse the result of the other run if it finished a sync while we were
+    # waiting, and nothing has changed locally since
+    result = read_sync_result()
+    if result and result["finished"] >= waiting_since and result["outcome"] in ["synced", "no changes"]:
+        os.chdir(DOTFILES_DIR)
+        status = collect_status(fetch=False)
+        if status["local"] == "" and status["remote"] == "":
+            sprint("Reusing result of concurrent run: " + result["outcome"])
+            exit()
+
+    return lock_file
 
-        # Get remote status
+def get_tree_signature():
+    """
+    Computes a cheap signature of the dotfiles working tree and git metadata,
+    from file names, sizes and modification times. The signature changes
+    whenever a file is edited, added or removed, or the repository is updated.
+    """
+    signature = hashlib.sha1()
+    git_dir = os.path.join(DOTFILES_DIR, ".git")
+    for path in [os.path.join(git_dir, "HEAD"), os.path.join(git_dir, "index"),
+                 os.path.join(git_dir, "packed-refs")]:
         try:
-            check_call(["git", "fetch", "origin"], stdout=outstream, stderr=errstream)
-            status = check_output(["git", "diff", "origin/master", "HEAD", "--name-status"], stderr=errstream)
+            stat = os.stat(path)
+            signature.update(("%s:%d:%r\n" % (path, stat.st_size, stat.st_mtime)).encode("UTF-8"))
+        except OSError:
+            pass
+
+    for top in [DOTFILES_DIR, os.path.join(git_dir, "refs")]:
+        for root, dirs, files in os.walk(top):
+            if root == DOTFILES_DIR and ".git" in dirs:
+                dirs.remove(".git")
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.lstat(path)
+                except OSError:
+                    continue
+                signature.update(("%s:%d:%r\n" % (path, stat.st_size, stat.st_mtime)).encode("UTF-8"))
 
-            if status:
-                sprint("\nRemote Dotfiles Status:")
-                parse_print_diff(status)
-                changes_found = True
-            else:
-                sprint("\nNo remote changes!")
-        except CalledProcessError:
-            error_detected = True
-            sprint("\nError: Unable to get remote status")
-    else:
-        sprint("\nWarning: Dotfiles directory does not exist. Skipping status check.")
-        changes_found = True
+    return signature.hexdigest()
 
-    if error_detected:
-        raise DotfileStatusError
+def query_status_daemon():
+    """
+    Asks a running status daemon for the status of local and remote dotfiles.
+    Returns the status in the form returned by collect_status, or None if no
+    daemon is running.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(STATUS_SOCKET_PATH):
+        return None
 
-    return changes_found
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(STATUS_QUERY_TIMEOUT)
+    try:
+        client.connect(STATUS_SOCKET_PATH)
+        client.sendall(b"status\n")
+        response = b""
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            response += data
+        return json.loads(response.decode("UTF-8"))
+    except (socket.error, ValueError):
+        return None
+    finally:
+        client.close()
+
+def serve_status():
+    """
+    Runs a daemon that keeps the status of local and remote dotfiles in memory,
+    and answers status queries over a Unix domain socket.
+    The local status is refreshed whenever the dotfiles change, and the remote
+    is fetched on a fixed interval. Queries are answered from memory without
+    running git.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        sprint("Error: Unix domain sockets are not supported on this platform!")
+        return
+
+    os.chdir(DOTFILES_DIR)
+
+    # Remove a socket left behind by a daemon that did not shut down cleanly
+    if os.path.exists(STATUS_SOCKET_PATH):
+        if query_status_daemon() is not None:
+            sprint("Status daemon already running.")
+            return
+        os.remove(STATUS_SOCKET_PATH)
+
+    refresh_lock = threading.Lock()
+    # Shared with the refresh threads: the encoded response, and whether the
+    # last fetch succeeded
+    state = {"response": None, "fetched": True}
+
+    def refresh(fetch=False):
+        """
+        Recompute the status and cache the encoded response.
+        Returns False without refreshing while a sync is running, since the
+        repository is changing and the sync fetches the remote itself.
+        """
+        if sync_in_progress():
+            return False
+
+        with refresh_lock:
+            if fetch:
+                try:
+                    run_command(["git", "fetch", get_remotes()[0]], "network")
+                    state["fetched"] = True
+                except CalledProcessError:
+                    state["fetched"] = False
+
+            status = collect_status(fetch=False)
+            if not state["fetched"]:
+                status["remote"] = None
+            state["response"] = json.dumps(status).encode("UTF-8")
+            dprint("Status refreshed at " + datetime.now().isoformat())
+        return True
+
+    def watch_files():
+        """Refresh the status whenever the dotfiles change."""
+        signature = get_tree_signature()
+        while True:
+            time.sleep(FILE_POLL_INTERVAL)
+            current = get_tree_signature()
+            # Keep the old signature while a sync is running, so the status is
+            # refreshed once it finishes
+            if current != signature and refresh():
+                signature = current
+
+    def poll_remote():
+        """Fetch the remote and refresh the status on a fixed interval."""
+        while True:
+            time.sleep(REMOTE_POLL_INTERVAL)
+            refresh(fetch=True)
+
+    while not refresh(fetch=True):
+        time.sleep(FILE_POLL_INTERVAL)
+    for target in [watch_files, poll_remote]:
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    # Exit normally when terminated, so the socket is cleaned up
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(STATUS_SOCKET_PATH)
+    server.listen(16)
+    sprint("Serving dotfiles status on " + STATUS_SOCKET_PATH)
+    try:
+        while True:
+            connection = server.accept()[0]
+            try:
+                connection.settimeout(STATUS_QUERY_TIMEOUT)
+                connection.recv(64)
+                connection.sendall(state["response"])
+            except socket.error:
+                pass
+            finally:
+                connection.close()
+    finally:
+        server.close()
+        os.remove(STATUS_SOCKET_PATH)
+
+def run_phase(name, function, *args, **kwargs):
+    """
+    Runs a phase of the script, and records how long it took in the run stats.
+    Returns the result of the phase.
+
+    Keyword Args:
+    name -- name of the phase to record
+    function -- function that runs the phase
+    args -- positional arguments to pass to the function
+    kwargs -- keyword arguments to pass to the function
+    """
+    start = time.time()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        phases = run_stats["phases"]
+        phases[name] = phases.get(name, 0) + time.time() - start
+
+def open_history():
+    """
+    Opens the run history database, creating its tables if needed.
+    Returns None if the history cannot be kept.
+    """
+    if sqlite3 is None or not os.path.exists(os.path.dirname(HISTORY_PATH)):
+        return None
+
+    connection = sqlite3.connect(HISTORY_PATH)
+    connection.execute("CREATE TABLE IF NOT EXISTS runs ("
+                       "id INTEGER PRIMARY KEY, started REAL, mode TEXT, commands INTEGER, "
+                       "manifest_size INTEGER, link_actions INTEGER, bytes_fetched INTEGER)")
+    connection.execute("CREATE TABLE IF NOT EXISTS phases ("
+                       "run_id INTEGER, name TEXT, duration REAL)")
+    connection.execute("CREATE INDEX IF NOT EXISTS phases_run_id ON phases (run_id)")
+    return connection
+
+def record_run(mode, started):
+    """
+    Appends the stats of the current run to the run history, and drops the
+    oldest runs beyond the history limit.
+
+    Keyword Args:
+    mode -- name of the mode the script ran in
+    started -- time the run started
+    """
+    if not run_stats["phases"]:
+        return
+
+    try:
+        connection = open_history()
+        if connection is None:
+            return
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (started, mode, commands, manifest_size, link_actions, bytes_fetched) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (started, mode, run_stats["commands"], run_stats["manifest_size"],
+                 run_stats["link_actions"], run_stats["bytes_fetched"]))
+            connection.executemany(
+                "INSERT INTO phases (run_id, name, duration) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, name, duration) for name, duration in iteritems(run_stats["phases"])])
+            connection.execute("DELETE FROM phases WHERE run_id <= ?", (cursor.lastrowid - HISTORY_LIMIT,))
+            connection.execute("DELETE FROM runs WHERE id <= ?", (cursor.lastrowid - HISTORY_LIMIT,))
+        connection.close()
+    except sqlite3.Error as error:
+        dprint("Failed to record run history: " + str(error))
+
+def percentile(values, percent):
+    """
+    Gets the nearest-rank percentile of a list of values.
+
+    Keyword Args:
+    values -- sorted list of values
+    percent -- percentile to get, from 0 to 100
+    """
+    index = max(int(math.ceil(percent * len(values) / 100.0)) - 1, 0)
+    return values[index]
+
+def print_stats():
+    """
+    Reports timing percentiles for each phase of past runs, and flags phases
+    whose recent runs are noticeably slower than the runs before them.
+    """
+    connection = open_history()
+    if connection is None:
+        sprint("\nNo run history available.")
+        return
+
+    runs = connection.execute(
+        "SELECT mode, COUNT(*), AVG(commands), AVG(manifest_size), AVG(link_actions), AVG(bytes_fetched) "
+        "FROM runs GROUP BY mode ORDER BY mode").fetchall()
+    # Durations for each phase, oldest run first
+    durations = {}
+    for mode, name, duration in connection.execute(
+            "SELECT runs.mode, phases.name, phases.duration FROM phases "
+            "JOIN runs ON runs.id = phases.run_id ORDER BY runs.id"):
+        durations.setdefault((mode, name), []).append(duration)
+    connection.close()
+
+    if not runs:
+        sprint("\nNo run history available.")
+        return
+
+    for mode, count, commands, manifest_size, link_actions, bytes_fetched in runs:
+        sprint("\n" + mode + " (" + str(count) + " runs)")
+        sprint("Average commands: %.1f, manifest size: %.1f, link actions: %.1f, bytes fetched: %d" %
+               (commands, manifest_size, link_actions, bytes_fetched or 0))
+
+        phases = sorted((name, values) for (phase_mode, name), values in iteritems(durations) if phase_mode == mode)
+        longest_name = max([len(name) for name, _ in phases] or [0])
+        for name, values in phases:
+            ordered = sorted(values)
+            line = "%s - p50 %.3fs  p90 %.3fs  p99 %.3fs" % (
+                name + " " * (longest_name - len(name)),
+                percentile(ordered, 50), percentile(ordered, 90), percentile(ordered, 99))
+
+            recent = sorted(values[-REGRESSION_WINDOW:])
+            baseline = sorted(values[-REGRESSION_WINDOW - BASELINE_WINDOW:-REGRESSION_WINDOW])
+            if len(baseline) >= REGRESSION_WINDOW:
+                recent_median = percentile(recent, 50)
+                baseline_median = percentile(baseline, 50)
+                if (recent_median > baseline_median * REGRESSION_FACTOR and
+                        recent_median - baseline_median > REGRESSION_MIN_SECONDS):
+                    line += "  REGRESSED (%.3fs -> %.3fs)" % (baseline_median, recent_median)
+
+            sprint(line)
+
+def get_schedule_offset(interval):
+    """
+    Gets the offset of this computer's time slot within each interval.
+    The offset is derived from the hostname, so it is the same on every run,
+    but spread evenly across the computers sharing a remote.
+
+    Keyword Args:
+    interval -- seconds between scheduled runs
+    """
+    digest = hashlib.sha1(socket.gethostname().encode("UTF-8")).hexdigest()
+    return int(digest, 16) % interval
+
+def get_next_run(interval, after=None):
+    """
+    Gets the time of the next time slot for this computer.
+
+    Keyword Args:
+    interval -- seconds between scheduled runs
+    after -- optional time the slot must not be before, defaults to now
+    """
+    if after is None:
+        after = time.time()
+    next_run = after - after % interval + get_schedule_offset(interval)
+    if next_run < after:
+        next_run += interval
+    return next_run
+
+def write_next_run(next_run, interval):
+    """
+    Records the time of the next scheduled run.
+
+    Keyword Args:
+    next_run -- time of the next run
+    interval -- seconds between scheduled runs
+    """
+    schedule = {
+        "next_run": next_run,
+        "next_run_time": datetime.fromtimestamp(next_run).isoformat(),
+        "interval": interval,
+        "offset": get_schedule_offset(interval),
+    }
+    try:
+        with open(SCHEDULE_PATH, "w") as schedule_file:
+            json.dump(schedule, schedule_file, indent=2)
+    except IOError:
+        vprint("Failed to record next scheduled run.")
+
+def wait_for_time_slot(interval):
+    """
+    Waits until this computer's time slot, so computers started by identical
+    cron entries do not all sync with the remote at the same moment.
+
+    Keyword Args:
+    interval -- seconds between scheduled runs
+    """
+    next_run = get_next_run(interval)
+    if os.path.exists(os.path.dirname(SCHEDULE_PATH)):
+        write_next_run(next_run, interval)
+
+    sprint("\nWaiting for scheduled time slot at " + datetime.fromtimestamp(next_run).strftime("%Y-%m-%d %H:%M:%S") + "...")
+    while time.time() < next_run:
+        time.sleep(min(next_run - time.time(), 60))
+
+def sync(commit_message, size_before):
+    """
+    Runs every phase of a full sync of the dotfiles.
+
+    Keyword Args:
+    commit_message -- message to use as the commit message for this update
+    size_before -- size of the object store before the status check fetched,
+    or None if it could not be measured
+    """
+    run_phase("dependencies", check_dependencies)
+    run_phase("self_update", self_update)
+    run_phase("github_setup", github_setup)
+    run_phase("directory_setup", directory_setup)
+    run_phase("repo_setup", repo_setup)
+
+    run_phase("pull", pull_changes)
+    size_after = get_object_store_size()
+    if size_before is None or size_after is None:
+        run_stats["bytes_fetched"] = None
+    else:
+        run_stats["bytes_fetched"] = max(size_after - size_before, 0)
+
+    run_phase("readme", check_readme)
+    run_phase("manifest", manifest_setup)
+    files = run_phase("read_manifest", read_manifest)
+    run_phase("links", update_links, files)
+    run_phase("push", push_changes, commit_message)
+    run_phase("maintenance", schedule_maintenance)
 
 def main():
     """Script entry point."""
@@ -855,8 +2880,31 @@ def main():
     parser.add_argument("--selfupdate", help="Check if an update to Updot is available", action="store_true")
     parser.add_argument("--doctor", help="Ensure all dependencies are met, and git and SSH are properly configured", action="store_true")
     parser.add_argument("--relink", help="Re-link all dotfiles into place", action="store_true")
+    parser.add_argument("--verify", help="Check that all dotfiles are still linked, and show changes to any copies", action="store_true")
+    parser.add_argument("--maintain", help="Run maintenance on the dotfiles repository now", action="store_true")
+    parser.add_argument("--serve", help="Run a daemon that answers status queries from memory", action="store_true")
+    parser.add_argument("--export-bundle", help="Package the dotfiles for setting up a computer without network access", metavar="PATH")
+    parser.add_argument("--bootstrap", help="Set up the dotfiles from a package created with --export-bundle", metavar="PATH")
+    parser.add_argument("--remote-timeout", help="Seconds to wait on each remote before giving up on it", type=int)
+    parser.add_argument("--budget", help="Maximum number of seconds the whole run may take", type=int)
+    parser.add_argument("--no-multiplex", help="Open a new SSH connection for every remote operation", action="store_true")
+    parser.add_argument("--stats", help="Report timing trends from the history of past runs", action="store_true")
+    parser.add_argument("--schedule", help="Wait for this computer's time slot before syncing, for use from cron", action="store_true")
+    parser.add_argument("--interval", help="Seconds between scheduled runs (default: 3600)", type=int, default=SCHEDULE_INTERVAL)
+    parser.add_argument("--next-run", help="Print the time of this computer's next scheduled run", action="store_true")
+    parser.add_argument("--coalesce", help="When another run is syncing, wait and reuse its result, or exit right away (default: wait)",
+                        choices=["wait", "exit"], default="wait")
     args = parser.parse_args()
 
+    # Record this run in the history once it exits, however it exits
+    mode = "sync"
+    for option in ["selfupdate", "doctor", "relink", "verify", "maintain", "export_bundle", "bootstrap", "schedule"]:
+        if getattr(args, option):
+            mode = option
+    started = time.time()
+    if not (args.serve or args.stats or args.next_run or args.status):
+        atexit.register(record_run, mode, started)
+
     # Set options based on args
     if args.debug:
         set_debug()
@@ -865,6 +2913,19 @@ def main():
     elif args.silent:
         SILENT = True
 
+    if args.remote_timeout:
+        OPERATION_TIMEOUTS["network"] = args.remote_timeout
+    # Only share SSH connections for modes that reach a remote, since setting
+    # them up costs a git call and a temporary directory
+    local_only = (args.status or args.relink or args.verify or args.maintain or args.stats or
+                  args.next_run or args.export_bundle or args.bootstrap)
+    if not (args.no_multiplex or local_only):
+        start_ssh_multiplexing()
+
+    # Do not leave background commands, such as slow mirror fetches, running.
+    # Registered last so it runs before the other exit handlers
+    atexit.register(stop_active_commands)
+
     # Set custom commit message if one was provided
     commit_message = DEFAULT_COMMIT_MESSAGE
     if args.message:
@@ -874,26 +2935,80 @@ def main():
     if DEBUG:
         sprint("Debug Mode: Enabled")
 
+    if args.next_run:
+        next_run = get_next_run(args.interval)
+        print(datetime.fromtimestamp(next_run).strftime("%Y-%m-%d %H:%M:%S"))
+        exit()
+
+    # Wait before starting the run budget, so it only covers the sync itself
+    if args.schedule:
+        wait_for_time_slot(args.interval)
+    if args.budget:
+        start_run_budget(args.budget)
+
+    if args.stats:
+        print_stats()
+        exit()
+
     if args.selfupdate:
-        check_dependencies()
-        self_update()
+        run_phase("dependencies", check_dependencies)
+        run_phase("self_update", self_update)
         exit()
 
     if args.doctor:
-        check_dependencies()
-        setup_check = github_setup()
+        run_phase("dependencies", check_dependencies)
+        setup_check = run_phase("github_setup", github_setup)
         if setup_check:
             sprint("\nNo problems detected. All systems go!")
         exit()
 
     if args.relink:
-        files = read_manifest()
-        update_links(files)
+        files = run_phase("read_manifest", read_manifest)
+        run_phase("links", update_links, files)
         exit()
 
+    if args.verify:
+        files = run_phase("read_manifest", read_manifest)
+        linked = run_phase("verify", verify_links, files)
+        sys.exit(0 if linked else 1)
+
+    if args.maintain:
+        os.chdir(DOTFILES_DIR)
+        run_phase("maintenance", maintain_repo)
+        exit()
+
+    if args.export_bundle:
+        run_phase("export_bundle", export_bundle, args.export_bundle)
+        exit()
+
+    if args.bootstrap:
+        run_phase("bootstrap", bootstrap_from_bundle, args.bootstrap)
+        exit()
+
+    if args.serve:
+        try:
+            serve_status()
+        except KeyboardInterrupt:
+            pass
+        exit()
+
+    # Only one run may sync at a time, while status checks run concurrently.
+    # The object store is measured before the status check fetches, so the
+    # fetched bytes include that fetch as well as the pull
+    sync_started = None
+    size_before = None
+    if not args.status:
+        size_before = get_object_store_size()
+        lock_file = run_phase("lock", acquire_sync_lock, args.coalesce)
+        if lock_file:
+            # Supersede the last result, until this run has its own status
+            sync_started = started
+            write_sync_result(sync_started, "syncing", None)
+
     try:
         # Check dotfile status
-        changes = get_status()
+        changes = run_phase("status", get_status, use_daemon=args.status,
+                            sync_started=sync_started)
 
         # Simply exit if user is only checking status
         if args.status:
@@ -904,10 +3019,11 @@ def main():
         # Exit if no changes were found
         if not changes:
             sprint("No changes detected. Nothing to sync.")
+            write_sync_result(started, "no changes", {"local": "", "remote": ""})
             exit()
 
-        # Prompt the user to continue if not running in silent mode
-        if not SILENT:
+        # Prompt the user to continue if not running in silent or scheduled mode
+        if not (SILENT or args.schedule):
             choice = input("\nContinue syncing detected changes? [y/n] ").lower()
             if choice == "y":
                 pass
@@ -918,19 +3034,16 @@ def main():
         exit()
 
     # Execute script
-    check_dependencies()
-    self_update()
-    github_setup()
-    directory_setup()
-    repo_setup()
-    pull_changes()
-    check_readme()
-    manifest_setup()
-    files = read_manifest()
-    update_links(files)
-    push_changes(commit_message)
+    sync(commit_message, size_before)
+    write_sync_result(started, "synced", collect_status(fetch=False))
+    if args.schedule:
+        write_next_run(get_next_run(args.interval, time.time() + 1), args.interval)
 
     sprint("\nComplete - Dotfiles updated!")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except RunBudgetExceededError:
+        sprint("\nError: Run budget exhausted. Stopping...")
+        sys.exit(1)